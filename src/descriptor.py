@@ -4,6 +4,11 @@ import utils
 
 STOP_SYMBOL = b"[STOP]"
 
+# priority classes of gpu allocation
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
 
 class BaseDescriptor:
     def to_byte_str(self, end_with: bytes = STOP_SYMBOL) -> bytes:
@@ -29,7 +34,10 @@ class BaseRequest(BaseDescriptor):
 
 
 class Request_AllocateGpus(BaseRequest):
-    def __init__(self, num_gpus: int, exclusive: bool, mem_size: int = None):
+    # requests from clients without priority support
+    priority = PRIORITY_NORMAL
+
+    def __init__(self, num_gpus: int, exclusive: bool, mem_size: int = None, priority: int = PRIORITY_NORMAL):
         """
         Request: allocate gpu.
         Args:
@@ -37,10 +45,13 @@ class Request_AllocateGpus(BaseRequest):
             exclusive: whether to allow others to use the gpu
             mem_size: estimate memory size you require while judging if a gpu has
         enough memory space.
+            priority: priority class, gpus reserved with lower priority may be preempted
+        to satisfy this request.
         """
         self.num_gpus = num_gpus
         self.exclusive = exclusive
         self.mem_size = mem_size
+        self.priority = priority
 
 
 class Request_ReleaseGpus(BaseRequest):
@@ -52,6 +63,28 @@ class Request_GetSystemInfo(BaseRequest):
     pass
 
 
+class Request_GetPreemptionNotices(BaseRequest):
+    def __init__(self, uuids: List[str]):
+        """
+        Request: query whether given reservations are going to be (or were) preempted.
+        Args:
+            uuids: uuids of gpu holders to query
+        """
+        self.uuids = uuids
+
+
+class Request_GetGpuHistory(BaseRequest):
+    def __init__(self, indices: List[int] = None, seconds: float = None):
+        """
+        Request: get recent samples of gpus taken by the server.
+        Args:
+            indices: indices of gpus, all gpus if `None`
+            seconds: only samples of last `seconds` seconds, all kept samples if `None`
+        """
+        self.indices = indices
+        self.seconds = seconds
+
+
 class BaseResult(BaseDescriptor):
     pass
 
@@ -69,8 +102,39 @@ class Result_GetSystemInfo(BaseResult):
         self.info = info
 
 
+class Result_GetPreemptionNotices(BaseResult):
+    def __init__(self, notices: Dict[str, float]):
+        """
+        Args:
+            notices: map from uuid of a preempted gpu holder to the time (`time.time()`)
+        when it is (or was) released by the server. Uuids not preempted are absent.
+        """
+        self.notices = notices
+
+
+class Result_GetGpuHistory(BaseResult):
+    def __init__(self, history: Dict[int, Dict[str, List]]):
+        """
+        Args:
+            history: map from gpu index to its samples in chronological order, as lists of
+        `timestamps`, `utilization` (percent), `free_memory` (bytes, not counting memory of
+        gpu holders) and `num_processes` (not counting gpu holders).
+        """
+        self.history = history
+
+
 class Result_ReleaseGpus(BaseResult):
     def __init__(self, success: bool, failed_uuids: List[int]):
         self.success = success
         self.failed_uuids = failed_uuids
 
+
+
+class Result_Rejected(BaseResult):
+    def __init__(self, reason: str):
+        """
+        Result: request rejected by admission control of the server without being handled.
+        Args:
+            reason: why the request is rejected
+        """
+        self.reason = reason
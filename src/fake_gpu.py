@@ -0,0 +1,205 @@
+import itertools
+from contextlib import contextmanager
+from functools import partial
+from typing import List
+
+import server
+import gpu_holder
+import descriptor
+from gpu_holder import CUDARuntimeError
+
+
+# memory taken by the cuda context of every holder process
+CONTEXT_MEMORY = 256 * 1024 ** 2
+
+
+class NVMLError(Exception):
+    def __init__(self, value: int):
+        self.value = value
+
+    def __str__(self):
+        return "NVMLError(value: {})".format(self.value)
+
+
+class FakeProcess:
+    def __init__(self, pid: int, used_memory: int):
+        self.pid = pid
+        self.usedGpuMemory = used_memory
+
+
+class FakeUtilization:
+    def __init__(self, gpu: int, memory: int):
+        self.gpu = gpu
+        self.memory = memory
+
+
+class FakeMemoryInfo:
+    def __init__(self, total: int, used: int):
+        self.total = total
+        self.used = used
+        self.free = total - used
+
+
+class FakeDevice:
+    """Modelled gpu, also serves as its own nvml handle"""
+    def __init__(self, index: int, total_memory: int):
+        self.index = index
+        self.total_memory = total_memory
+        self.compute_mode = FakeNvml.NVML_COMPUTEMODE_DEFAULT
+        self.processes: List[FakeProcess] = list()
+        self.used_memory = 0
+        # percent, set by users modelling load
+        self.utilization = 0
+
+    @property
+    def free_memory(self) -> int:
+        return self.total_memory - self.used_memory
+
+    def add_process(self, process: FakeProcess):
+        self.processes.append(process)
+        self.used_memory += process.usedGpuMemory
+
+    def remove_process(self, process: FakeProcess):
+        self.processes.remove(process)
+        self.used_memory -= process.usedGpuMemory
+
+
+class FakeNvml:
+    """
+    In memory stand-in of the `pynvml` module functions used by the server.
+
+    Args:
+        num_gpus: number of modelled gpus
+        total_memory: memory size in bytes of every modelled gpu
+    """
+    NVMLError = NVMLError
+    NVML_ERROR_NO_PERMISSION = 4
+    NVML_COMPUTEMODE_DEFAULT = 0
+    NVML_COMPUTEMODE_EXCLUSIVE_PROCESS = 3
+
+    def __init__(self, num_gpus: int = 8, total_memory: int = 16 * 1024 ** 3):
+        self.devices = [FakeDevice(i, total_memory) for i in range(num_gpus)]
+        self._pid_counter = itertools.count(100000)
+
+    def next_pid(self) -> int:
+        return next(self._pid_counter)
+
+    def nvmlInit(self):
+        pass
+
+    def nvmlShutdown(self):
+        pass
+
+    def nvmlSystemGetDriverVersion(self) -> bytes:
+        return b"fake"
+
+    def nvmlDeviceGetCount(self) -> int:
+        return len(self.devices)
+
+    def nvmlDeviceGetHandleByIndex(self, index: int) -> FakeDevice:
+        return self.devices[index]
+
+    def nvmlDeviceGetComputeRunningProcesses(self, handle: FakeDevice) -> List[FakeProcess]:
+        return list(handle.processes)
+
+    def nvmlDeviceGetMemoryInfo(self, handle: FakeDevice) -> FakeMemoryInfo:
+        return FakeMemoryInfo(handle.total_memory, handle.used_memory)
+
+    def nvmlDeviceGetUtilizationRates(self, handle: FakeDevice) -> FakeUtilization:
+        return FakeUtilization(handle.utilization, 0)
+
+    def nvmlDeviceGetComputeMode(self, handle: FakeDevice) -> int:
+        return handle.compute_mode
+
+    def nvmlDeviceSetComputeMode(self, handle: FakeDevice, compute_mode: int):
+        handle.compute_mode = compute_mode
+
+
+class FakeGpuHolder:
+    """
+    Stand-in of `GpuHolder` which books a process on a `FakeNvml` device instead
+    of starting one.
+    """
+    def __init__(
+        self,
+        fake_nvml: FakeNvml,
+        index: int,
+        exclusive: bool = False,
+        priority: int = descriptor.PRIORITY_NORMAL,
+        job_id: str = None
+    ):
+        self._fake_nvml = fake_nvml
+        self._index = index
+        self._exclusive = exclusive
+        self._priority = priority
+        self._job_id = job_id
+        self._alive = False
+        self.pid = fake_nvml.next_pid()
+
+        device = fake_nvml.devices[index]
+        exclusive_mode = device.compute_mode == FakeNvml.NVML_COMPUTEMODE_EXCLUSIVE_PROCESS
+        if exclusive_mode and len(device.processes) > 0:
+            raise CUDARuntimeError(index, "cudaErrorDevicesUnavailable", "")
+        used_memory = CONTEXT_MEMORY
+        if not exclusive:
+            used_memory += int(max(device.free_memory - CONTEXT_MEMORY, 0) * gpu_holder.ALLOC_PERCENTAGE)
+        if used_memory > device.free_memory:
+            raise CUDARuntimeError(index, "cudaErrorMemoryAllocation", "")
+        self._process = FakeProcess(self.pid, used_memory)
+        device.add_process(self._process)
+        self._alive = True
+
+    def __repr__(self):
+        return "FakeGpuHolder(index: {}, exclusive: {}, priority: {}, is_alive: {})".format(
+            self._index,
+            self._exclusive,
+            self._priority,
+            self.is_alive()
+        )
+
+    def __str__(self):
+        return self.__repr__()
+
+    def is_alive(self) -> bool:
+        return self._alive
+
+    def stop(self):
+        if self._alive:
+            self._fake_nvml.devices[self._index].remove_process(self._process)
+            self._alive = False
+
+    @property
+    def exclusive(self) -> bool:
+        return self._exclusive
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def priority(self) -> int:
+        return self._priority
+
+    @property
+    def job_id(self) -> str:
+        return self._job_id
+
+
+@contextmanager
+def fake_backend(num_gpus: int = 8, total_memory: int = 16 * 1024 ** 3):
+    """
+    Run `server` against modelled gpus: within the context, the server module
+    uses a `FakeNvml` instead of `pynvml` and `FakeGpuHolder` instead of `GpuHolder`.
+
+    Yield:
+        the `FakeNvml` in use, for inspecting or modifying the modelled gpus
+    """
+    fake_nvml = FakeNvml(num_gpus, total_memory)
+    saved_nvml, saved_holder = server.nvml, server.GpuHolder
+    server.nvml = fake_nvml
+    server.GpuHolder = partial(FakeGpuHolder, fake_nvml)
+    try:
+        yield fake_nvml
+    finally:
+        server.nvml = saved_nvml
+        server.GpuHolder = saved_holder
@@ -0,0 +1,105 @@
+import numpy as np
+from typing import Dict, List
+
+
+class WindowStats:
+    """Statistics of the samples of a gpu within a time window"""
+    def __init__(
+        self,
+        num_samples: int,
+        mean_utilization: float,
+        max_utilization: float,
+        mean_free_memory: float,
+        min_free_memory: int,
+        max_processes: int
+    ):
+        self.num_samples = num_samples
+        self.mean_utilization = mean_utilization
+        self.max_utilization = max_utilization
+        self.mean_free_memory = mean_free_memory
+        self.min_free_memory = min_free_memory
+        self.max_processes = max_processes
+
+    def __repr__(self):
+        return "WindowStats(num_samples: {}, mean_utilization: {}, max_utilization: {}, " \
+            "mean_free_memory: {}, min_free_memory: {}, max_processes: {})".format(
+                self.num_samples,
+                self.mean_utilization,
+                self.max_utilization,
+                self.mean_free_memory,
+                self.min_free_memory,
+                self.max_processes
+            )
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class GpuHistory:
+    """
+    Fixed size ring buffers of recent samples of one gpu, the oldest sample is
+    overwritten when full.
+
+    Args:
+        size: max number of samples kept
+    """
+    def __init__(self, size: int):
+        self._size = size
+        self._next = 0
+        self._count = 0
+        self._timestamps = np.zeros(size, dtype=np.float64)
+        self._utilization = np.zeros(size, dtype=np.float32)
+        self._free_memory = np.zeros(size, dtype=np.int64)
+        self._num_processes = np.zeros(size, dtype=np.int32)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp: float, utilization: float, free_memory: int, num_processes: int):
+        i = self._next
+        self._timestamps[i] = timestamp
+        self._utilization[i] = utilization
+        self._free_memory[i] = free_memory
+        self._num_processes[i] = num_processes
+        self._next = (i + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def window(self, seconds: float, now: float) -> WindowStats:
+        """
+        Get statistics of samples taken in the last `seconds` before `now`.
+
+        Return:
+        `None` if there is no sample in the window.
+        """
+        mask = self._timestamps[:self._count] >= now - seconds
+        num_samples = int(np.count_nonzero(mask))
+        if num_samples == 0:
+            return None
+        utilization = self._utilization[:self._count][mask]
+        free_memory = self._free_memory[:self._count][mask]
+        return WindowStats(
+            num_samples,
+            float(utilization.mean()),
+            float(utilization.max()),
+            float(free_memory.mean()),
+            int(free_memory.min()),
+            int(self._num_processes[:self._count][mask].max())
+        )
+
+    def to_dict(self, seconds: float = None, now: float = None) -> Dict[str, List]:
+        """
+        Get samples in chronological order as lists, only those taken in the last
+        `seconds` before `now` if `seconds` is given.
+        """
+        if self._count < self._size:
+            order = np.arange(self._count)
+        else:
+            order = np.roll(np.arange(self._size), -self._next)
+        if seconds is not None:
+            order = order[self._timestamps[order] >= now - seconds]
+        return dict(
+            timestamps=self._timestamps[order].tolist(),
+            utilization=self._utilization[order].tolist(),
+            free_memory=self._free_memory[order].tolist(),
+            num_processes=self._num_processes[order].tolist(),
+        )
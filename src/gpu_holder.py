@@ -4,6 +4,8 @@ import time
 from multiprocessing import Process, Pipe, Value
 from ctypes import c_bool
 
+import descriptor
+
 
 ALLOC_PERCENTAGE = 0.7
 
@@ -36,14 +38,24 @@ class GpuHolder(Process):
     calculate mode `NVML_COMPUTEMODE_EXCLUSIVE_PROCESS`, create a process will prevent
     other process using this gpu by running a tiny process. If `False`, allocate memory
     for holding this gpu.
+        priority: priority class of the reservation, see `descriptor.PRIORITY_*`
+        job_id: id of the allocation request this holder belongs to
     """
-    def __init__(self, index: int, exclusive: bool = False):
+    def __init__(
+        self,
+        index: int,
+        exclusive: bool = False,
+        priority: int = descriptor.PRIORITY_NORMAL,
+        job_id: str = None
+    ):
         super().__init__(
             target=self.hold_gpu,
             name="gpu holder process"
         )
         self._index = index
         self._exclusive = exclusive
+        self._priority = priority
+        self._job_id = job_id
         self._pipe_i, self._pipe_o = Pipe()
         self._exception_pipe_i, self._exception_pipe_o = Pipe()
         self._alloc_success = Value(c_bool, False)
@@ -52,9 +64,10 @@ class GpuHolder(Process):
 
 
     def __repr__(self):
-        return "GpuHolder(index: {}, exclusive: {}, is_alive: {})".format(
+        return "GpuHolder(index: {}, exclusive: {}, priority: {}, is_alive: {})".format(
             self._index,
             self._exclusive,
+            self._priority,
             self.is_alive()
         )
 
@@ -87,6 +100,14 @@ class GpuHolder(Process):
     def index(self) -> int:
         return self._index
 
+    @property
+    def priority(self) -> int:
+        return self._priority
+
+    @property
+    def job_id(self) -> str:
+        return self._job_id
+
     def hold_gpu(self):
         """
         Gpu holder process.
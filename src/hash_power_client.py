@@ -18,6 +18,15 @@ class AllocateGpuFailed(Exception):
     pass
 
 
+class RequestRejected(Exception):
+    """Request is rejected by admission control of the server"""
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def __str__(self):
+        return self.reason
+
+
 class HashPowerClient(TCPClient):
     def __init__(
         self,
@@ -43,14 +52,22 @@ class HashPowerClient(TCPClient):
         result = descriptor.BaseResult.from_byte_str(result_byte)
         if not stream.closed():
             stream.close()
+        if type(result) == descriptor.Result_Rejected:
+            raise RequestRejected(result.reason)
         return result
 
     #################################################################################
     ## async requests
 
-    async def async_allocate_gpus(self, num_gpus: int, exclusive: bool = False, mem_size: int = None):
+    async def async_allocate_gpus(
+        self,
+        num_gpus: int,
+        exclusive: bool = False,
+        mem_size: int = None,
+        priority: int = descriptor.PRIORITY_NORMAL
+    ):
         try:
-            request = descriptor.Request_AllocateGpus(num_gpus, exclusive, mem_size)
+            request = descriptor.Request_AllocateGpus(num_gpus, exclusive, mem_size, priority)
             result: descriptor.Result_AllocateGpus = await self._session(request)
             if type(result) != descriptor.Result_AllocateGpus:
                 raise ResultTypeError
@@ -82,10 +99,36 @@ class HashPowerClient(TCPClient):
         except StreamClosedError:
             print("[error] can not connect")
 
+    async def async_get_preemption_notices(self, uuids: List[str]):
+        request = descriptor.Request_GetPreemptionNotices(uuids)
+        try:
+            result: descriptor.Result_GetPreemptionNotices = await self._session(request)
+            if type(result) != descriptor.Result_GetPreemptionNotices:
+                raise ResultTypeError
+            return result
+        except StreamClosedError:
+            print("[error] can not connect")
+
+    async def async_get_gpu_history(self, indices: List[int] = None, seconds: float = None):
+        request = descriptor.Request_GetGpuHistory(indices, seconds)
+        try:
+            result: descriptor.Result_GetGpuHistory = await self._session(request)
+            if type(result) != descriptor.Result_GetGpuHistory:
+                raise ResultTypeError
+            return result
+        except StreamClosedError:
+            print("[error] can not connect")
+
     #################################################################################
     ## sync requests
-    def allocate_gpus(self, num_gpus: int, exclusive: bool = False, mem_size: int = None):
-        result = self._loop.run_sync(partial(self.async_allocate_gpus, num_gpus, exclusive, mem_size))
+    def allocate_gpus(
+        self,
+        num_gpus: int,
+        exclusive: bool = False,
+        mem_size: int = None,
+        priority: int = descriptor.PRIORITY_NORMAL
+    ):
+        result = self._loop.run_sync(partial(self.async_allocate_gpus, num_gpus, exclusive, mem_size, priority))
         return result
 
     def get_system_info(self):
@@ -96,3 +139,11 @@ class HashPowerClient(TCPClient):
         result = self._loop.run_sync(partial(self.async_release_gpus, uuids))
         return result
 
+
+    def get_preemption_notices(self, uuids: List[str]):
+        result = self._loop.run_sync(partial(self.async_get_preemption_notices, uuids))
+        return result
+
+    def get_gpu_history(self, indices: List[int] = None, seconds: float = None):
+        result = self._loop.run_sync(partial(self.async_get_gpu_history, indices, seconds))
+        return result
@@ -4,14 +4,24 @@ import atexit
 import multiprocessing
 import argparse
 from tornado.ioloop import IOLoop
-from server import HashPowerDistributer
+from server import (
+    HashPowerDistributer,
+    MAX_MESSAGE_SIZE,
+    READ_TIMEOUT,
+    IDLE_TIMEOUT,
+    MAX_CONNECTIONS,
+    RATE_LIMIT,
+    RATE_BURST,
+    PREEMPTION_GRACE_PERIOD
+)
 
 
-def make_daemon(host, port, pid_file=None):
+def make_daemon(host, port, pid_file=None, **server_kwargs):
     """
     Create daemon process
     Args:
         pid_file: pid file of process id
+        server_kwargs: keyword arguments of `HashPowerDistributer`
     """
     pid = os.fork()
     if pid:
@@ -45,7 +55,7 @@ def make_daemon(host, port, pid_file=None):
         atexit.register(os.remove, pid_file)
 
     # run ioloop
-    server = HashPowerDistributer(logger_path="/var/log/hashpwd/")
+    server = HashPowerDistributer(logger_path="/var/log/hashpwd/", **server_kwargs)
     server.listen(port, host)
     IOLoop.current().start()
 
@@ -55,11 +65,27 @@ if __name__ == "__main__":
     parser.add_argument("--pid_filepath", type=str)
     parser.add_argument("--port", type=int, default=13105)
     parser.add_argument("--host", type=str, default="localhost")
+    parser.add_argument("--trace_filepath", type=str)
+    parser.add_argument("--max_message_size", type=int, default=MAX_MESSAGE_SIZE)
+    parser.add_argument("--read_timeout", type=float, default=READ_TIMEOUT)
+    parser.add_argument("--idle_timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("--max_connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--rate_limit", type=float, default=RATE_LIMIT)
+    parser.add_argument("--rate_burst", type=int, default=RATE_BURST)
+    parser.add_argument("--preemption_grace_period", type=float, default=PREEMPTION_GRACE_PERIOD)
     args = parser.parse_args()
 
     multiprocessing.set_start_method('forkserver')
     make_daemon(
         host=args.host,
         port=args.port,
-        pid_file=args.pid_filepath
+        pid_file=args.pid_filepath,
+        trace_path=args.trace_filepath,
+        max_message_size=args.max_message_size,
+        read_timeout=args.read_timeout,
+        idle_timeout=args.idle_timeout,
+        max_connections=args.max_connections,
+        rate_limit=args.rate_limit,
+        rate_burst=args.rate_burst,
+        preemption_grace_period=args.preemption_grace_period
     )
@@ -0,0 +1,85 @@
+import pickle
+from typing import List, Tuple
+
+import descriptor
+
+
+class TraceRecord:
+    """
+    One served request in a workload trace.
+
+    Args:
+        timestamp: wall clock time (`time.time()`) when the request was decoded, or when
+    the connection was accepted if rejected before
+        address: address of the requester
+        request: decoded request descriptor, `None` if rejected before being decoded
+        result: result descriptor sent back to the requester, `descriptor.Result_Rejected`
+    if rejected by admission control
+        latency: seconds the server spent handling the request
+    """
+    def __init__(
+        self,
+        timestamp: float,
+        address: Tuple[str, int],
+        request: descriptor.BaseRequest,
+        result: descriptor.BaseResult,
+        latency: float
+    ):
+        self.timestamp = timestamp
+        self.address = address
+        self.request = request
+        self.result = result
+        self.latency = latency
+
+    def __repr__(self):
+        return "TraceRecord(timestamp: {}, address: {}, request: {}, result: {}, latency: {})".format(
+            self.timestamp,
+            self.address,
+            self.request,
+            self.result,
+            self.latency
+        )
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class WorkloadRecorder:
+    """
+    Append served requests to a trace file, one pickled `TraceRecord` after another.
+
+    Args:
+        trace_path: file to append records to, created if not exists
+    """
+    def __init__(self, trace_path: str):
+        self._trace_path = trace_path
+        self._trace_file = open(trace_path, "ab")
+
+    def record(
+        self,
+        timestamp: float,
+        address: Tuple[str, int],
+        request: descriptor.BaseRequest,
+        result: descriptor.BaseResult,
+        latency: float
+    ):
+        record = TraceRecord(timestamp, address, request, result, latency)
+        pickle.dump(record, self._trace_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._trace_file.flush()
+
+    def close(self):
+        if not self._trace_file.closed:
+            self._trace_file.close()
+
+
+def load_trace(trace_path: str) -> List[TraceRecord]:
+    """load all records of a trace file in recorded order"""
+    records: List[TraceRecord] = list()
+    with open(trace_path, "rb") as f:
+        while True:
+            try:
+                records.append(pickle.load(f))
+            except (EOFError, pickle.UnpicklingError):
+                # end of file, or truncated tail of an interrupted recording
+                break
+    return records
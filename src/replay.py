@@ -0,0 +1,182 @@
+import asyncio
+import argparse
+import tempfile
+import time
+from functools import partial
+from typing import Dict, List
+
+from tornado.ioloop import IOLoop
+
+import descriptor
+from fake_gpu import fake_backend
+from hash_power_client import HashPowerClient, RequestRejected
+from recorder import TraceRecord, load_trace
+from server import HashPowerDistributer, PREEMPTION_GRACE_PERIOD
+
+
+async def replay_trace(records: List[TraceRecord], client: HashPowerClient, speed: float = 1.0):
+    """
+    Send recorded requests to the server of `client`, keeping the recorded inter-arrival
+    times divided by `speed` (`float("inf")` sends all requests at once).
+
+    Uuids in recorded release requests are mapped to the uuids allocated during replay,
+    a release is sent after the allocations it depends on are done. Requests rejected
+    before being decoded are skipped, and rejections during replay are left to the trace
+    of the server.
+    """
+    uuid_map: Dict[str, str] = dict()
+    # recorded uuid -> task replaying the allocation of it
+    allocations: Dict[str, asyncio.Future] = dict()
+
+    async def send(record: TraceRecord):
+        request = record.request
+        if type(request) == descriptor.Request_ReleaseGpus:
+            dependencies = set(allocations[uuid] for uuid in request.uuids if uuid in allocations)
+            await asyncio.gather(*dependencies)
+            request = descriptor.Request_ReleaseGpus([uuid_map.get(uuid, uuid) for uuid in request.uuids])
+        try:
+            result = await client._session(request)
+        except RequestRejected:
+            return
+        if type(result) == descriptor.Result_AllocateGpus and type(record.result) == descriptor.Result_AllocateGpus:
+            uuid_map.update(zip(record.result.uuids, result.uuids))
+
+    if len(records) == 0:
+        return
+    tasks = list()
+    trace_start = records[0].timestamp
+    replay_start = time.time()
+    for record in records:
+        if record.request is None:
+            continue
+        delay = (record.timestamp - trace_start) / speed - (time.time() - replay_start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.ensure_future(send(record))
+        if type(record.result) == descriptor.Result_AllocateGpus:
+            for uuid in record.result.uuids:
+                allocations[uuid] = task
+        tasks.append(task)
+    await asyncio.gather(*tasks)
+
+
+def replay_against_fake_server(
+    trace_path: str,
+    output_path: str,
+    speed: float = 1.0,
+    num_gpus: int = 8,
+    gpu_memory: int = 16 * 1024 ** 3,
+    port: int = 13106,
+    rate_limit: float = None,
+    max_connections: int = None,
+    preemption_grace_period: float = None
+):
+    """
+    Replay a trace against an in process server backed by `fake_gpu`, recording
+    the replayed run to `output_path`, which is overwritten. As all requests come from
+    localhost, the server has no rate limit and connection cap unless given. The
+    preemption grace period defaults to `PREEMPTION_GRACE_PERIOD` divided by `speed`.
+    """
+    if preemption_grace_period is None:
+        preemption_grace_period = PREEMPTION_GRACE_PERIOD / speed
+    records = load_trace(trace_path)
+    open(output_path, "wb").close()
+    with fake_backend(num_gpus, gpu_memory), tempfile.TemporaryDirectory() as logger_path:
+        server = HashPowerDistributer(
+            logger_path=logger_path,
+            trace_path=output_path,
+            max_connections=max_connections,
+            rate_limit=rate_limit,
+            preemption_grace_period=preemption_grace_period
+        )
+        server.listen(port, "localhost")
+        client = HashPowerClient(server_address=("localhost", port))
+        try:
+            IOLoop.current().run_sync(partial(replay_trace, records, client, speed))
+        finally:
+            server.stop()
+            server.clean_up()
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def latency_stats(records: List[TraceRecord]) -> Dict[str, Dict[str, float]]:
+    """count, mean, p50 and p95 of server side latency per request type, rejections counted apart"""
+    latencies: Dict[str, List[float]] = dict()
+    for record in records:
+        if type(record.result) == descriptor.Result_Rejected:
+            name = type(record.result).__name__
+        else:
+            name = type(record.request).__name__
+        latencies.setdefault(name, list()).append(record.latency)
+    stats = dict()
+    for name, values in latencies.items():
+        values.sort()
+        stats[name] = dict(
+            count=len(values),
+            mean=sum(values) / len(values),
+            p50=_percentile(values, 0.5),
+            p95=_percentile(values, 0.95),
+        )
+    return stats
+
+
+def compare_traces(baseline: List[TraceRecord], replayed: List[TraceRecord]) -> str:
+    """Report latency of two runs of the same workload per request type, in milliseconds"""
+    baseline_stats = latency_stats(baseline)
+    replayed_stats = latency_stats(replayed)
+    lines = ["{:<24}{:>8}{:>8}{:>12}{:>12}{:>12}{:>12}{:>12}".format(
+        "request", "count_a", "count_b", "mean_a", "mean_b", "p95_a", "p95_b", "delta_mean"
+    )]
+    for name in sorted(set(baseline_stats) | set(replayed_stats)):
+        a = baseline_stats.get(name, dict(count=0, mean=0.0, p50=0.0, p95=0.0))
+        b = replayed_stats.get(name, dict(count=0, mean=0.0, p50=0.0, p95=0.0))
+        lines.append("{:<24}{:>8}{:>8}{:>12.3f}{:>12.3f}{:>12.3f}{:>12.3f}{:>+12.3f}".format(
+            name,
+            a["count"],
+            b["count"],
+            a["mean"] * 1e3,
+            b["mean"] * 1e3,
+            a["p95"] * 1e3,
+            b["p95"] * 1e3,
+            (b["mean"] - a["mean"]) * 1e3
+        ))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded workload against a fake gpu server.")
+    parser.add_argument("trace_filepath", type=str)
+    parser.add_argument("--compare", type=str, help="only compare the trace with this trace, no replay")
+    parser.add_argument("--output", type=str, help="trace of the replayed run, default: <trace_filepath>.replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed up factor, `inf` for no waiting")
+    parser.add_argument("--num_gpus", type=int, default=8)
+    parser.add_argument("--gpu_memory", type=int, default=16 * 1024 ** 3)
+    parser.add_argument("--port", type=int, default=13106)
+    parser.add_argument("--rate_limit", type=float, help="rate limit of the fake server, default: unlimited")
+    parser.add_argument("--max_connections", type=int, help="connection cap of the fake server, default: unlimited")
+    parser.add_argument(
+        "--preemption_grace_period",
+        type=float,
+        help="preemption grace period of the fake server in seconds, default: scaled by speed"
+    )
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        other_path = args.compare
+    else:
+        other_path = args.output if args.output is not None else args.trace_filepath + ".replay"
+        replay_against_fake_server(
+            args.trace_filepath,
+            other_path,
+            speed=args.speed,
+            num_gpus=args.num_gpus,
+            gpu_memory=args.gpu_memory,
+            port=args.port,
+            rate_limit=args.rate_limit,
+            max_connections=args.max_connections,
+            preemption_grace_period=args.preemption_grace_period
+        )
+    print(compare_traces(load_trace(args.trace_filepath), load_trace(other_path)))
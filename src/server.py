@@ -1,19 +1,45 @@
 import pynvml as nvml
 import ssl
 import os
+import time
 import asyncio
+import inspect
 import traceback
-from typing import Dict, Any, Union, Tuple, List
+from typing import Dict, Any, Union, Tuple, List, Set
 from tornado.tcpserver import TCPServer
 from tornado.iostream import IOStream, StreamClosedError
 from tornado.ioloop import IOLoop
+from tornado import gen
 
 import descriptor
 import utils
 from gpu_holder import GpuHolder, CUDARuntimeError
+from gpu_history import GpuHistory, WindowStats
+from recorder import WorkloadRecorder
 
 
 GPU_IDLE_THRESHOLD = 0.7
+# max utilization (percent) of an idle gpu
+GPU_UTIL_IDLE_THRESHOLD = 10.0
+
+# gpu sampling: seconds between samples, samples kept per gpu, seconds of samples
+# used to judge whether a gpu is idle
+GPU_SAMPLE_INTERVAL = 1.0
+GPU_HISTORY_SIZE = 600
+GPU_STATS_WINDOW = 10.0
+
+# seconds between preemption notice and reclaiming of a reservation
+PREEMPTION_GRACE_PERIOD = 30.0
+# seconds to keep a preemption notice queryable after reclaiming
+NOTICE_RETENTION = 3600.0
+
+# admission control defaults
+MAX_MESSAGE_SIZE = 64 * 1024
+READ_TIMEOUT = 10.0
+IDLE_TIMEOUT = 5.0
+MAX_CONNECTIONS = 128
+RATE_LIMIT = 20.0
+RATE_BURST = 40
 
 
 # helper functions
@@ -21,12 +47,31 @@ def _no_running_processes(handle: nvml.c_nvmlDevice_t) -> bool:
     return len(nvml.nvmlDeviceGetComputeRunningProcesses(handle)) == 0
 
 
-def _enough_memory(handle: nvml.c_nvmlDevice_t, mem_size: int) -> bool:
-    mem_info = nvml.nvmlDeviceGetMemoryInfo(handle)
+def _enough_free_memory(free: int, total: int, mem_size: int) -> bool:
     if mem_size is not None:
-        return mem_info.free > mem_size
+        return free > mem_size
     else:
-        return mem_info.free / mem_info.total > GPU_IDLE_THRESHOLD
+        return free / total > GPU_IDLE_THRESHOLD
+
+
+def _enough_memory(handle: nvml.c_nvmlDevice_t, mem_size: int, stats: WindowStats = None) -> bool:
+    """
+    Judge on current free memory, or on the smaller of current and average free
+    memory in the window of `stats` if given. Memory cached by an idle process still
+    counts as used, as a gpu holder can not allocate it.
+    """
+    mem_info = nvml.nvmlDeviceGetMemoryInfo(handle)
+    free = mem_info.free if stats is None else min(mem_info.free, stats.mean_free_memory)
+    return _enough_free_memory(free, mem_info.total, mem_size)
+
+
+def _idle_over_window(stats: WindowStats, exclusive: bool) -> bool:
+    """Whether a gpu stayed idle during the window of `stats`, `True` if without samples"""
+    if stats is None:
+        return True
+    if stats.max_utilization > GPU_UTIL_IDLE_THRESHOLD:
+        return False
+    return not exclusive or stats.max_processes == 0
 
 
 def _device_in_default_model(handle: nvml.c_nvmlDevice_t) -> bool:
@@ -37,11 +82,47 @@ class GPUHolderProcessNotStartedError(Exception):
     pass
 
 
+class RequestRejectedError(Exception):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def __str__(self):
+        return self.reason
+
+
 class HashPowerDistributer(TCPServer):
-    """Hash power distributer"""
+    """
+    Hash power distributer
+
+    Args:
+        logger_path: directory of server log
+        trace_path: if given, record every served request and its result to this file,
+    see `recorder.WorkloadRecorder`.
+        max_message_size: max size in bytes of a request, including `descriptor.STOP_SYMBOL`
+        read_timeout: max seconds to receive a whole request
+        idle_timeout: max seconds to wait for the next piece of a request
+        max_connections: max number of connections handled concurrently, `None` for unlimited
+        rate_limit: max requests per second from one client host, `None` for unlimited
+        rate_burst: max requests from one client host in a burst
+        preemption_grace_period: seconds between noticing owners of preempted reservations
+    and reclaiming them.
+        start_daemons: whether to start daemon and gpu sampler on the io loop, `False` for
+    driving the server without an io loop, e.g. in simulation.
+
+    Requests beyond these limits get a `descriptor.Result_Rejected` back.
+    """
     def __init__(
         self,
         logger_path: str = "/var/log/hashpwd/",
+        trace_path: str = None,
+        max_message_size: int = MAX_MESSAGE_SIZE,
+        read_timeout: float = READ_TIMEOUT,
+        idle_timeout: float = IDLE_TIMEOUT,
+        max_connections: int = MAX_CONNECTIONS,
+        rate_limit: float = RATE_LIMIT,
+        rate_burst: int = RATE_BURST,
+        preemption_grace_period: float = PREEMPTION_GRACE_PERIOD,
+        start_daemons: bool = True,
         ssl_options: Union[Dict[str, Any], ssl.SSLContext] = None,
         max_buffer_size: int = None,
         read_chunk_size: int = None,
@@ -50,14 +131,37 @@ class HashPowerDistributer(TCPServer):
         self._despatch_task_map = {
             descriptor.Request_AllocateGpus: self._allocate_gpus,
             descriptor.Request_GetSystemInfo: self._get_system_info,
-            descriptor.Request_ReleaseGpus: self._release_gpus
+            descriptor.Request_ReleaseGpus: self._release_gpus,
+            descriptor.Request_GetPreemptionNotices: self._get_preemption_notices,
+            descriptor.Request_GetGpuHistory: self._get_gpu_history
         }
         self._io_loop = IOLoop.current()
         self._gpu_usage_db: Dict[str, GpuHolder] = dict()
 
+        # preemption
+        self._preemption_grace_period = preemption_grace_period
+        # uuid of preempted gpu holder -> time when it is reclaimed
+        self._preemption_notices: Dict[str, float] = dict()
+        # gpus being reclaimed for a higher priority request
+        self._reserved_gpus: Set[int] = set()
+
+        # admission control
+        self._max_message_size = max_message_size
+        self._read_timeout = read_timeout
+        self._idle_timeout = idle_timeout
+        self._max_connections = max_connections
+        self._rate_limit = rate_limit
+        self._rate_burst = rate_burst
+        self._num_connections = 0
+        self._rate_limiters: Dict[str, utils.TokenBucket] = dict()
+
+        # recent samples of each gpu, filled by `_sampler`
+        self._gpu_histories: Dict[int, GpuHistory] = dict()
+
         if not os.path.isdir(logger_path):
             os.makedirs(logger_path)
         self._logger_file = open(os.path.join(logger_path, "hashpwd.log"), "w")
+        self._recorder = WorkloadRecorder(trace_path) if trace_path is not None else None
         # initial nvml
         try:
             nvml.nvmlInit()
@@ -66,7 +170,9 @@ class HashPowerDistributer(TCPServer):
         # reset all gpu settings
         self._reset_all_gpus()
         # start daemon
-        self._io_loop.add_callback(self._daemon)
+        if start_daemons:
+            self._io_loop.add_callback(self._daemon)
+            self._io_loop.add_callback(self._sampler)
 
     ######################################################################################
     # auxillary functions
@@ -103,40 +209,96 @@ class HashPowerDistributer(TCPServer):
             except nvml.NVMLError as error:
                 self._handle_nvml_error(error, traceback.format_exc())
 
-    def _gpu_in_use(self, index):
-        """Check if given gpu has workers registered in self._gpu_usage_db"""
-        in_use = False
-        for holder in self._gpu_usage_db.values():
-            if holder.index == index:
-                in_use = True
-                break
-        return in_use
+    def _gpus_in_use(self) -> Set[int]:
+        """Get gpus which have workers registered in self._gpu_usage_db"""
+        return set(holder.index for holder in self._gpu_usage_db.values())
+
+    def _get_window_stats(self, index: int, now: float) -> WindowStats:
+        """Get statistics of the last `GPU_STATS_WINDOW` seconds of a gpu, `None` if not sampled"""
+        if index not in self._gpu_histories:
+            return None
+        return self._gpu_histories[index].window(GPU_STATS_WINDOW, now)
 
     def _get_idle_gpus(self, exclusive: bool, mem_size: int) -> List[int]:
         """
-        Get list of idle gpus.
+        Get list of idle gpus, which are idle both now and over the sampled window.
 
         Possible exceptions:
             `NVMLError`
         """
         gpu_count = nvml.nvmlDeviceGetCount()
         idle_gpus = list()
+        gpus_in_use = self._gpus_in_use() if exclusive else set()
+        now = time.time()
 
         for i in range(gpu_count):
+            if i in self._reserved_gpus:
+                continue
+            stats = self._get_window_stats(i, now)
+            if not _idle_over_window(stats, exclusive):
+                continue
             handle = nvml.nvmlDeviceGetHandleByIndex(i)
             if exclusive:
-                no_running = _no_running_processes(handle)
-                no_future_running = not self._gpu_in_use(i)
-                enough_mem = _enough_memory(handle, mem_size)
-                if no_running and no_future_running and enough_mem:
+                no_future_running = i not in gpus_in_use
+                if no_future_running and _no_running_processes(handle) and _enough_memory(handle, mem_size, stats):
                     idle_gpus.append(i)
             else:
-                if _enough_memory(handle, mem_size) and _device_in_default_model(handle):
+                if _enough_memory(handle, mem_size, stats) and _device_in_default_model(handle):
                     idle_gpus.append(i)
 
         return idle_gpus
 
-    def _allocate_gpu(self, index: int, exclusive: bool) -> str:
+    def _get_reclaimable_gpus(self, priority: int, exclude: List[int] = ()) -> Dict[int, List[str]]:
+        """
+        Get gpus reserved only by gpu holders with priority lower than `priority`. Processes
+        running on them and their sampled load are not checked, as they are usually the jobs
+        of the holders' owners, which are expected to quit during the grace period.
+
+        Args:
+            exclude: gpus not to reclaim, e.g. those idle already
+
+        Return:
+        Map from gpu index to uuids of gpu holders to release.
+        """
+        holders: Dict[int, List[str]] = dict()
+        for uuid, holder in self._gpu_usage_db.items():
+            holders.setdefault(holder.index, list()).append(uuid)
+
+        reclaimable_gpus = dict()
+        for i, uuids in holders.items():
+            if i in self._reserved_gpus or i in exclude:
+                continue
+            if any(self._gpu_usage_db[uuid].priority >= priority for uuid in uuids):
+                continue
+            reclaimable_gpus[i] = uuids
+        return reclaimable_gpus
+
+    def _select_victims(self, reclaimable_gpus: Dict[int, List[str]], num_gpus: int) -> Dict[int, List[str]]:
+        """
+        Greedily select `num_gpus` gpus from `reclaimable_gpus` disturbing as few jobs
+        as possible, where gpus of an already disturbed job are free to take. Among gpus
+        disturbing as many new jobs, those whose jobs hold more reclaimable gpus go first.
+        """
+        selected = dict()
+        disturbed_jobs = set()
+        job_gpus: Dict[str, Set[int]] = dict()
+        for i, uuids in reclaimable_gpus.items():
+            for uuid in uuids:
+                job_gpus.setdefault(self._gpu_usage_db[uuid].job_id, set()).add(i)
+
+        def cost(i: int):
+            jobs = set(self._gpu_usage_db[uuid].job_id for uuid in reclaimable_gpus[i])
+            new_jobs = jobs - disturbed_jobs
+            freed_gpus = set().union(*(job_gpus[job] for job in new_jobs))
+            return len(new_jobs), -len(freed_gpus), len(reclaimable_gpus[i]), i
+
+        while len(selected) < num_gpus:
+            i = min((i for i in reclaimable_gpus if i not in selected), key=cost)
+            selected[i] = reclaimable_gpus[i]
+            disturbed_jobs.update(self._gpu_usage_db[uuid].job_id for uuid in reclaimable_gpus[i])
+        return selected
+
+    def _allocate_gpu(self, index: int, exclusive: bool, priority: int, job_id: str) -> str:
         """
         Allocate idle gpu. When `exclusive` is True, modify gpu compute mode to `EXCLUSIVE_PROCESS`.
 
@@ -149,7 +311,7 @@ class HashPowerDistributer(TCPServer):
         if exclusive:
             self._set_gpu_compute_mode(index, nvml.NVML_COMPUTEMODE_EXCLUSIVE_PROCESS)
         uuid = utils.get_uuid()
-        self._gpu_usage_db[uuid] = GpuHolder(index, exclusive)
+        self._gpu_usage_db[uuid] = GpuHolder(index, exclusive, priority, job_id)
         return uuid
 
     def _release_gpu(self, uuid: str, handle_NVMLError: bool = False):
@@ -166,7 +328,7 @@ class HashPowerDistributer(TCPServer):
         try:
             self._gpu_usage_db[uuid].stop()
             # clear exclusive flag
-            self._set_gpu_compute_mode(self._gpu_usage_db[uuid].index, nvml.DEFAULT_MODE)
+            self._set_gpu_compute_mode(self._gpu_usage_db[uuid].index, nvml.NVML_COMPUTEMODE_DEFAULT)
             self._gpu_usage_db.pop(uuid)
         except nvml.NVMLError as error:
             if not handle_NVMLError:
@@ -196,15 +358,122 @@ class HashPowerDistributer(TCPServer):
                         except nvml.NVMLError as error:
                             self._handle_nvml_error(error, traceback.format_exc())
                     self._gpu_usage_db.pop(uuid)
+            # forget outdated preemption notices
+            now = time.time()
+            for uuid in list(self._preemption_notices.keys()):
+                if self._preemption_notices[uuid] + NOTICE_RETENTION < now:
+                    self._preemption_notices.pop(uuid)
+            # forget clients which have not sent requests recently
+            for host in list(self._rate_limiters.keys()):
+                if self._rate_limiters[host].full:
+                    self._rate_limiters.pop(host)
             await asyncio.sleep(5)
 
+    def _sample_gpu(self, index: int, holder_pids: Set[int], timestamp: float):
+        """
+        Append a sample of a gpu to its history. Gpu holders are excluded from process
+        count and used memory, so that the history shows load from others only.
+
+        Possible exceptions:
+            `NVMLError`
+        """
+        handle = nvml.nvmlDeviceGetHandleByIndex(index)
+        utilization = nvml.nvmlDeviceGetUtilizationRates(handle).gpu
+        mem_info = nvml.nvmlDeviceGetMemoryInfo(handle)
+        free_memory = mem_info.free
+        num_processes = 0
+        for process in nvml.nvmlDeviceGetComputeRunningProcesses(handle):
+            if process.pid in holder_pids:
+                free_memory += process.usedGpuMemory or 0
+            else:
+                num_processes += 1
+        if index not in self._gpu_histories:
+            self._gpu_histories[index] = GpuHistory(GPU_HISTORY_SIZE)
+        self._gpu_histories[index].append(timestamp, utilization, free_memory, num_processes)
+
+    async def _sampler(self):
+        """
+        Sample utilization, memory and process count of all gpus every `GPU_SAMPLE_INTERVAL`
+        seconds.
+
+        Handle exceptions:
+            `NVMLError`
+        """
+        self._log("[info] gpu sampler started")
+        while True:
+            holder_pids = set(holder.pid for holder in self._gpu_usage_db.values())
+            timestamp = time.time()
+            try:
+                for i in range(nvml.nvmlDeviceGetCount()):
+                    self._sample_gpu(i, holder_pids, timestamp)
+            except nvml.NVMLError as error:
+                # gpus without samples fall back to current status
+                self._log_exception(error, traceback.format_exc())
+            await asyncio.sleep(GPU_SAMPLE_INTERVAL)
+
     ######################################################################################
     # descriptor handlers
 
-    def _allocate_gpus(self, desc: descriptor.Request_AllocateGpus, stream: IOStream):
+    async def _allocate_gpus(self, desc: descriptor.Request_AllocateGpus, stream: IOStream):
         """
-        Get gpu number wanted to allocate from descriptor and try to allocate them,
-        and finally send result back to requester.
+        Allocate gpus, preempting reservations of lower priority if there are not enough
+        idle gpus. Owners of preempted gpu holders get a notice (see
+        `_get_preemption_notices`) and holders are released after the grace period,
+        during which the reclaimed gpus and the idle gpus counted in are kept from other
+        requests. Afterwards exactly these gpus are allocated, if they are idle by then.
+
+        Handle exceptions:
+            `NVMLError`
+        """
+        result = self._try_allocate_gpus(desc)
+        if result.success:
+            return result
+
+        try:
+            idle_gpus = self._get_idle_gpus(desc.exclusive, desc.mem_size)
+        except nvml.NVMLError as error:
+            self._log_exception(error, traceback.format_exc())
+            return result
+        # idle gpus are taken without preempting their holders
+        reclaimable_gpus = self._get_reclaimable_gpus(desc.priority, exclude=idle_gpus)
+        # failed for other reasons than lack of idle gpus, or can not be satisfied by preempting
+        if len(idle_gpus) >= desc.num_gpus or len(idle_gpus) + len(reclaimable_gpus) < desc.num_gpus:
+            return result
+
+        victims = self._select_victims(reclaimable_gpus, desc.num_gpus - len(idle_gpus))
+        wanted_gpus = idle_gpus + sorted(victims.keys())
+        reclaim_time = time.time() + self._preemption_grace_period
+        for uuids in victims.values():
+            for uuid in uuids:
+                self._preemption_notices[uuid] = reclaim_time
+        self._log("[info] preempt {} for request {}".format(victims, desc))
+
+        self._reserved_gpus.update(wanted_gpus)
+        try:
+            await asyncio.sleep(self._preemption_grace_period)
+            for i, uuids in victims.items():
+                for uuid in uuids:
+                    # owners may have released them during grace period
+                    if uuid in self._gpu_usage_db:
+                        self._release_gpu(uuid, handle_NVMLError=True)
+                # sampled load is of the preempted owners, judge on current status instead
+                self._gpu_histories.pop(i, None)
+        finally:
+            self._reserved_gpus.difference_update(wanted_gpus)
+        return self._try_allocate_gpus(desc, wanted_gpus)
+
+    def _try_allocate_gpus(
+        self,
+        desc: descriptor.Request_AllocateGpus,
+        gpus: List[int] = None
+    ) -> descriptor.Result_AllocateGpus:
+        """
+        Get gpu number wanted to allocate from descriptor and try to allocate them
+        from idle gpus.
+
+        Args:
+            gpus: if given, allocate exactly these gpus, and fail if any of them is not idle
+        or is given more than once
 
         Handle exceptions:
             `NVMLError`, `CUDARuntimeError`
@@ -222,15 +491,21 @@ class HashPowerDistributer(TCPServer):
 
         try:
             idle_gpus = self._get_idle_gpus(desc.exclusive, desc.mem_size)
-            if len(idle_gpus) < desc.num_gpus:
-                success = True
-                return descriptor.Result_AllocateGpus(False, list(), list(), list())
-
-            wanted_gpus = idle_gpus[: desc.num_gpus]
+            if gpus is not None:
+                if len(set(gpus)) != len(gpus) or not set(gpus).issubset(idle_gpus):
+                    success = True
+                    return descriptor.Result_AllocateGpus(False, list(), list(), list())
+                wanted_gpus = list(gpus)
+            else:
+                if len(idle_gpus) < desc.num_gpus:
+                    success = True
+                    return descriptor.Result_AllocateGpus(False, list(), list(), list())
+                wanted_gpus = idle_gpus[: desc.num_gpus]
 
             # allocate gpus
+            job_id = utils.get_uuid()
             for i in wanted_gpus:
-                uuid = self._allocate_gpu(i, desc.exclusive)
+                uuid = self._allocate_gpu(i, desc.exclusive, desc.priority, job_id)
                 uuids.append(uuid)
                 if self._gpu_usage_db[uuid].pid is None:
                     raise GPUHolderProcessNotStartedError
@@ -273,6 +548,21 @@ class HashPowerDistributer(TCPServer):
                 result.failed_uuids.append(uuid)
         return result
 
+    def _get_preemption_notices(self, desc: descriptor.Request_GetPreemptionNotices, stream: IOStream):
+        """Get reclaiming time of preempted gpu holders in given request."""
+        notices = {uuid: self._preemption_notices[uuid] for uuid in desc.uuids if uuid in self._preemption_notices}
+        return descriptor.Result_GetPreemptionNotices(notices)
+
+    def _get_gpu_history(self, desc: descriptor.Request_GetGpuHistory, stream: IOStream):
+        """Get recent samples of gpus from their histories."""
+        indices = desc.indices if desc.indices is not None else sorted(self._gpu_histories.keys())
+        now = time.time()
+        history = {
+            i: self._gpu_histories[i].to_dict(desc.seconds, now)
+            for i in indices if i in self._gpu_histories
+        }
+        return descriptor.Result_GetGpuHistory(history)
+
     def _get_system_info(self, desc: descriptor.Request_GetSystemInfo, stream: IOStream):
         """
         Get system infomation.
@@ -295,26 +585,109 @@ class HashPowerDistributer(TCPServer):
     ######################################################################################
     ## iostream handler
 
+    def _record(
+        self,
+        timestamp: float,
+        address: Tuple[str, int],
+        desc: descriptor.BaseRequest,
+        result_desc: descriptor.BaseResult,
+        start: float
+    ):
+        """Record a served or rejected request if recording is enabled"""
+        if self._recorder is not None:
+            self._recorder.record(timestamp, address, desc, result_desc, time.perf_counter() - start)
+
+    def _admit(self, address: Tuple[str, int]):
+        """
+        Check whether a new connection can be handled.
+
+        Possible exceptions:
+            `RequestRejectedError`
+        """
+        if self._max_connections is not None and self._num_connections > self._max_connections:
+            raise RequestRejectedError("too many concurrent connections")
+        if self._rate_limit is not None:
+            host = address[0]
+            if host not in self._rate_limiters:
+                self._rate_limiters[host] = utils.TokenBucket(self._rate_limit, self._rate_burst)
+            if not self._rate_limiters[host].consume():
+                raise RequestRejectedError("rate limit exceeded")
+
+    async def _read_request(self, stream: IOStream) -> descriptor.BaseRequest:
+        """
+        Read a request within size and time limits.
+
+        Possible exceptions:
+            `RequestRejectedError`, `StreamClosedError`
+        """
+        buffer = bytearray()
+        deadline = self._io_loop.time() + self._read_timeout
+        while True:
+            # read one more byte than allowed to detect oversized requests
+            read_future = stream.read_bytes(self._max_message_size - len(buffer) + 1, partial=True)
+            timeout = min(deadline, self._io_loop.time() + self._idle_timeout)
+            try:
+                chunk = await gen.with_timeout(timeout, read_future, quiet_exceptions=StreamClosedError)
+            except gen.TimeoutError:
+                raise RequestRejectedError("timeout while reading request")
+            # the stop symbol may span two chunks
+            search_start = max(len(buffer) - len(descriptor.STOP_SYMBOL) + 1, 0)
+            buffer += chunk
+            stop = buffer.find(descriptor.STOP_SYMBOL, search_start)
+            if stop >= 0 and stop + len(descriptor.STOP_SYMBOL) <= self._max_message_size:
+                break
+            if len(buffer) > self._max_message_size:
+                raise RequestRejectedError("request larger than {} bytes".format(self._max_message_size))
+
+        try:
+            desc = utils.from_byte_str(bytes(buffer[:stop]))
+        except Exception:
+            raise RequestRejectedError("malformed request")
+        if type(desc) not in self._despatch_task_map:
+            raise RequestRejectedError("unknown request type {}".format(type(desc).__name__))
+        return desc
+
     async def handle_stream(self, stream: IOStream, address: Tuple[str, int]):
         """
         Handle request of a slave, coroutine of main event loop.
 
         Handle exceptions:
-            `StreamClosedError`
+            `StreamClosedError`, `RequestRejectedError`
         """
+        self._num_connections += 1
+        # request stays `None` in the trace if rejected before being decoded
+        desc = None
+        timestamp = time.time()
+        start = time.perf_counter()
         try:
             self._log("[info] get access from {}:{}".format(*address))
-            descriptor_bytes = await stream.read_until(descriptor.STOP_SYMBOL)
-            desc = utils.from_byte_str(descriptor_bytes)
+            self._admit(address)
+            desc = await self._read_request(stream)
             # deal with descriptor
+            timestamp = time.time()
+            start = time.perf_counter()
             result_desc = self._despatch_task_map[type(desc)](desc, stream)
+            if inspect.isawaitable(result_desc):
+                result_desc = await result_desc
+            self._record(timestamp, address, desc, result_desc, start)
             # write result
             await stream.write(result_desc.to_byte_str())
             # close connection
             stream.close()
+        except RequestRejectedError as error:
+            self._log("[warning] reject request from {}:{}: {}".format(*address, error))
+            result_desc = descriptor.Result_Rejected(error.reason)
+            self._record(timestamp, address, desc, result_desc, start)
+            try:
+                await stream.write(result_desc.to_byte_str())
+                stream.close()
+            except StreamClosedError:
+                pass
         except StreamClosedError as error:
             self._log("[error] connection from {}:{} is closed unexpectedly".format(*address))
             self._log_exception(error, traceback.format_exc())
+        finally:
+            self._num_connections -= 1
 
     def clean_up(self):
         """
@@ -330,6 +703,8 @@ class HashPowerDistributer(TCPServer):
         except nvml.NVMLError as error:
             self._log_exception(error, traceback.format_exc())
         finally:
+            if self._recorder is not None:
+                self._recorder.close()
             self._logger_file.close()
             self._io_loop.stop()
 
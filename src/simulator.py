@@ -0,0 +1,282 @@
+import heapq
+import random
+import argparse
+import tempfile
+import itertools
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List
+
+import descriptor
+import gpu_holder
+import server
+from fake_gpu import fake_backend
+from recorder import TraceRecord, load_trace
+from server import HashPowerDistributer
+
+
+# event kinds, departures first when happening at the same time
+DEPARTURE = 0
+ARRIVAL = 1
+
+
+class Job:
+    """
+    A job asking for gpus at `arrival` and releasing them `duration` seconds after
+    being allocated.
+    """
+    def __init__(
+        self,
+        arrival: float,
+        duration: float,
+        num_gpus: int,
+        exclusive: bool,
+        mem_size: int = None,
+        priority: int = descriptor.PRIORITY_NORMAL
+    ):
+        self.arrival = arrival
+        self.duration = duration
+        self.request = descriptor.Request_AllocateGpus(num_gpus, exclusive, mem_size, priority)
+        self.start: float = None
+        self.uuids: List[str] = list()
+
+    def __repr__(self):
+        return "Job(arrival: {}, duration: {}, request: {}, start: {})".format(
+            self.arrival,
+            self.duration,
+            self.request,
+            self.start
+        )
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class Policy:
+    """
+    Scheduling policy to simulate.
+
+    Args:
+        name: name in reports
+        gpu_idle_threshold: value of `server.GPU_IDLE_THRESHOLD`
+        alloc_percentage: value of `gpu_holder.ALLOC_PERCENTAGE`
+        server_class: `HashPowerDistributer` or a subclass overriding its selection logic,
+    e.g. `_get_idle_gpus`.
+    """
+    def __init__(
+        self,
+        name: str,
+        gpu_idle_threshold: float = server.GPU_IDLE_THRESHOLD,
+        alloc_percentage: float = gpu_holder.ALLOC_PERCENTAGE,
+        server_class: type = HashPowerDistributer
+    ):
+        self.name = name
+        self.gpu_idle_threshold = gpu_idle_threshold
+        self.alloc_percentage = alloc_percentage
+        self.server_class = server_class
+
+
+@contextmanager
+def _policy_constants(policy: Policy):
+    saved = server.GPU_IDLE_THRESHOLD, gpu_holder.ALLOC_PERCENTAGE
+    server.GPU_IDLE_THRESHOLD = policy.gpu_idle_threshold
+    gpu_holder.ALLOC_PERCENTAGE = policy.alloc_percentage
+    try:
+        yield
+    finally:
+        server.GPU_IDLE_THRESHOLD, gpu_holder.ALLOC_PERCENTAGE = saved
+
+
+def synthetic_jobs(
+    num_jobs: int,
+    arrival_rate: float,
+    mean_duration: float,
+    gpu_choices: List[int] = (1, 2, 4),
+    exclusive_ratio: float = 0.5,
+    seed: int = 0
+) -> List[Job]:
+    """Jobs with poisson arrivals and exponential durations"""
+    rng = random.Random(seed)
+    jobs = list()
+    arrival = 0.0
+    for _ in range(num_jobs):
+        arrival += rng.expovariate(arrival_rate)
+        jobs.append(Job(
+            arrival,
+            rng.expovariate(1 / mean_duration),
+            rng.choice(gpu_choices),
+            rng.random() < exclusive_ratio
+        ))
+    return jobs
+
+
+def jobs_from_trace(records: List[TraceRecord]) -> List[Job]:
+    """
+    Jobs of successful allocations in a trace recorded by `recorder.WorkloadRecorder`,
+    lasting until their gpus are released, or until the end of trace.
+    """
+    if len(records) == 0:
+        return list()
+    release_time: Dict[str, float] = dict()
+    for record in records:
+        if type(record.request) == descriptor.Request_ReleaseGpus:
+            for uuid in record.request.uuids:
+                release_time.setdefault(uuid, record.timestamp)
+
+    start, end = records[0].timestamp, records[-1].timestamp
+    jobs = list()
+    for record in records:
+        if type(record.result) != descriptor.Result_AllocateGpus or not record.result.success:
+            continue
+        released = min(release_time.get(uuid, end) for uuid in record.result.uuids)
+        request = record.request
+        jobs.append(Job(
+            record.timestamp - start,
+            released - record.timestamp,
+            request.num_gpus,
+            request.exclusive,
+            request.mem_size,
+            request.priority
+        ))
+    return jobs
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class SchedulingSimulator:
+    """
+    Discrete event simulator running the allocation code of the server against gpus
+    modelled by `fake_gpu`. Jobs are served first come first served: a job waits until
+    all jobs arrived before it are allocated.
+
+    Args:
+        num_gpus: number of modelled gpus
+        gpu_memory: memory size in bytes of every modelled gpu
+    """
+    def __init__(self, num_gpus: int = 8, gpu_memory: int = 16 * 1024 ** 3):
+        self._num_gpus = num_gpus
+        self._gpu_memory = gpu_memory
+
+    def run(self, jobs: List[Job], policy: Policy) -> Dict[str, float]:
+        """
+        Simulate `jobs` under `policy`.
+
+        Return:
+        Statistics of the run: `utilization` and `fragmentation` are time averaged
+        fractions of gpus reserved, and of gpus not reserved while jobs are waiting;
+        queueing delays are in seconds.
+        """
+        for job in jobs:
+            job.start = None
+            job.uuids = list()
+        counter = itertools.count()
+        events = [(job.arrival, ARRIVAL, next(counter), job) for job in jobs]
+        heapq.heapify(events)
+        queue = deque()
+        delays = list()
+        num_events = 0
+        unschedulable = 0
+        busy_time = 0.0
+        stranded_time = 0.0
+        first_time = events[0][0] if len(events) > 0 else 0.0
+        last_time = first_time
+
+        with fake_backend(self._num_gpus, self._gpu_memory) as fake_nvml, \
+                _policy_constants(policy), tempfile.TemporaryDirectory() as logger_path:
+            distributer = policy.server_class(logger_path=logger_path, start_daemons=False)
+            devices = fake_nvml.devices
+            while len(events) > 0:
+                now, kind, _, job = heapq.heappop(events)
+                num_events += 1
+
+                num_busy = sum(1 for device in devices if len(device.processes) > 0)
+                busy_time += num_busy * (now - last_time)
+                if len(queue) > 0:
+                    stranded_time += (self._num_gpus - num_busy) * (now - last_time)
+                last_time = now
+
+                if kind == ARRIVAL:
+                    if job.request.num_gpus > self._num_gpus or (job.request.mem_size or 0) >= self._gpu_memory:
+                        unschedulable += 1
+                        continue
+                    queue.append(job)
+                    # gpus are unchanged since the waiting head of queue failed
+                    if len(queue) > 1:
+                        continue
+                else:
+                    for uuid in job.uuids:
+                        distributer._release_gpu(uuid)
+
+                while len(queue) > 0:
+                    result = distributer._try_allocate_gpus(queue[0].request)
+                    if not result.success:
+                        break
+                    head = queue.popleft()
+                    head.start = now
+                    head.uuids = result.uuids
+                    delays.append(now - head.arrival)
+                    heapq.heappush(events, (now + head.duration, DEPARTURE, next(counter), head))
+            # not `clean_up`, which stops the io loop
+            distributer._logger_file.close()
+
+        delays.sort()
+        span = max(last_time - first_time, 1e-12) * self._num_gpus
+        return dict(
+            events=num_events,
+            jobs=len(delays),
+            unschedulable=unschedulable + len(queue),
+            utilization=busy_time / span,
+            fragmentation=stranded_time / span,
+            mean_delay=sum(delays) / max(len(delays), 1),
+            p95_delay=_percentile(delays, 0.95),
+            max_delay=delays[-1] if len(delays) > 0 else 0.0,
+        )
+
+
+def compare_policies(simulator: SchedulingSimulator, jobs: List[Job], policies: List[Policy]) -> str:
+    """Simulate `jobs` under every policy and report statistics as a table"""
+    columns = ["events", "jobs", "unschedulable", "utilization", "fragmentation", "mean_delay", "p95_delay"]
+    lines = ["{:<24}".format("policy") + "".join("{:>14}".format(c) for c in columns)]
+    for policy in policies:
+        stats = simulator.run(jobs, policy)
+        lines.append("{:<24}".format(policy.name) + "".join(
+            "{:>14}".format(stats[c]) if type(stats[c]) == int else "{:>14.4f}".format(stats[c])
+            for c in columns
+        ))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate gpu allocation policies of the server.")
+    parser.add_argument("--num_gpus", type=int, default=8)
+    parser.add_argument("--gpu_memory", type=int, default=16 * 1024 ** 3)
+    parser.add_argument("--trace_filepath", type=str, help="take jobs from a recorded trace")
+    parser.add_argument("--num_jobs", type=int, default=100000)
+    parser.add_argument("--arrival_rate", type=float, default=1.0, help="jobs per second")
+    parser.add_argument("--mean_duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--exclusive_ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--idle_thresholds", type=float, nargs="+", default=[server.GPU_IDLE_THRESHOLD])
+    parser.add_argument("--alloc_percentages", type=float, nargs="+", default=[gpu_holder.ALLOC_PERCENTAGE])
+    args = parser.parse_args()
+
+    if args.trace_filepath is not None:
+        jobs = jobs_from_trace(load_trace(args.trace_filepath))
+    else:
+        jobs = synthetic_jobs(
+            args.num_jobs,
+            args.arrival_rate,
+            args.mean_duration,
+            exclusive_ratio=args.exclusive_ratio,
+            seed=args.seed
+        )
+    policies = [
+        Policy("idle={} alloc={}".format(threshold, percentage), threshold, percentage)
+        for threshold in args.idle_thresholds
+        for percentage in args.alloc_percentages
+    ]
+    print(compare_policies(SchedulingSimulator(args.num_gpus, args.gpu_memory), jobs, policies))
@@ -1,5 +1,6 @@
 import pickle
 import uuid
+import time
 from tornado.iostream import IOStream
 
 
@@ -25,3 +26,32 @@ def bytes_to_str(s: str):
 def get_uuid() -> str:
     """get uuid1 as from hex string"""
     return uuid.uuid1().hex
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter, refilled with `rate` tokens per second up to `burst` tokens.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_update = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_update) * self.rate)
+        self._last_update = now
+
+    def consume(self, tokens: int = 1) -> bool:
+        """take `tokens` tokens if available, return whether succeeded"""
+        self._refill()
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self._tokens >= self.burst
@@ -0,0 +1,82 @@
+import tempfile
+from functools import partial
+from tornado.ioloop import IOLoop
+
+import descriptor
+from descriptor import PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH
+from fake_gpu import fake_backend
+from server import HashPowerDistributer
+
+
+def make_server(logger_path):
+    return HashPowerDistributer(logger_path=logger_path, start_daemons=False, preemption_grace_period=0.1)
+
+
+def allocate(server, desc):
+    return IOLoop.current().run_sync(partial(server._allocate_gpus, desc, None))
+
+
+def holder_indices(server):
+    return sorted(holder.index for holder in server._gpu_usage_db.values())
+
+
+def test_idle_gpus_not_reclaimed(logger_path):
+    with fake_backend(4):
+        server = make_server(logger_path)
+        server._allocate_gpu(0, False, PRIORITY_LOW, "shared_0")
+        server._allocate_gpu(1, False, PRIORITY_LOW, "shared_1")
+        server._allocate_gpu(2, True, PRIORITY_HIGH, "exclusive_2")
+        server._allocate_gpu(3, True, PRIORITY_LOW, "exclusive_3")
+
+        result = allocate(server, descriptor.Request_AllocateGpus(3, False, 1024 ** 3, PRIORITY_HIGH))
+        print(result)
+        assert result.success
+        assert sorted(result.allocated_gpus) == [0, 1, 3]
+        # only the exclusive holder on gpu 3 is preempted
+        assert holder_indices(server) == [0, 0, 1, 1, 2, 3]
+        assert len(server._preemption_notices) == 1
+
+        # a gpu can not be allocated twice
+        result = server._try_allocate_gpus(descriptor.Request_AllocateGpus(2, False, 1024 ** 3), [0, 0])
+        assert not result.success
+        server._logger_file.close()
+
+
+def test_fewest_jobs_victims(logger_path):
+    with fake_backend(4):
+        server = make_server(logger_path)
+        server._allocate_gpu(0, True, PRIORITY_LOW, "job_a")
+        server._allocate_gpu(1, True, PRIORITY_LOW, "job_b")
+        server._allocate_gpu(2, True, PRIORITY_LOW, "job_b")
+        server._allocate_gpu(3, True, PRIORITY_LOW, "job_c")
+
+        result = allocate(server, descriptor.Request_AllocateGpus(2, True, None, PRIORITY_HIGH))
+        print(result)
+        assert result.success
+        assert sorted(result.allocated_gpus) == [1, 2]
+        # jobs a and c are left alone
+        jobs = set(holder.job_id for holder in server._gpu_usage_db.values() if holder.priority == PRIORITY_LOW)
+        assert jobs == {"job_a", "job_c"}
+        server._logger_file.close()
+
+
+def test_equal_priority_not_preempted(logger_path):
+    with fake_backend(2):
+        server = make_server(logger_path)
+        server._allocate_gpu(0, True, PRIORITY_NORMAL, "job_a")
+        server._allocate_gpu(1, True, PRIORITY_NORMAL, "job_b")
+
+        result = allocate(server, descriptor.Request_AllocateGpus(1, True, None, PRIORITY_NORMAL))
+        print(result)
+        assert not result.success
+        assert holder_indices(server) == [0, 1]
+        assert len(server._preemption_notices) == 0
+        server._logger_file.close()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as logger_path:
+        test_idle_gpus_not_reclaimed(logger_path)
+        test_fewest_jobs_victims(logger_path)
+        test_equal_priority_not_preempted(logger_path)
+    print("all passed")
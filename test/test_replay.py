@@ -0,0 +1,7 @@
+from replay import replay_against_fake_server, compare_traces
+from recorder import load_trace
+
+
+if __name__ == "__main__":
+    replay_against_fake_server("./trace", "./trace.replay", speed=10, num_gpus=8, port=12001)
+    print(compare_traces(load_trace("./trace"), load_trace("./trace.replay")))